@@ -1,6 +1,12 @@
 from django.contrib import admin
 from .models import *
 
-admin.site.register(Book)
+
+class BookAdmin(admin.ModelAdmin):
+    list_filter = ('state', 'publisher', 'tags', 'publication_date')
+    search_fields = ('title', 'isbn')
+
+
+admin.site.register(Book, BookAdmin)
 admin.site.register(Publisher)
 admin.site.register(Author)
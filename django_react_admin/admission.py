@@ -0,0 +1,166 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+from . import facets
+
+DEFAULT_LIMITS = {
+    "list": {"concurrency": 8, "queue": 16, "timeout": 5},
+    "search": {"concurrency": 4, "queue": 8, "timeout": 5},
+    "export": {"concurrency": 2, "queue": 4, "timeout": 10},
+    "action": {"concurrency": 2, "queue": 4, "timeout": 10},
+    "bulk": {"concurrency": 4, "queue": 8, "timeout": 10},
+}
+
+
+class Overloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = {'error': True, 'message': 'too many concurrent requests'}
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class Gate:
+    """Concurrency limit with a bounded wait queue for one endpoint class."""
+    def __init__(self, name, concurrency, queue, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.active = self.waiting = 0
+        self.admitted = self.rejected = self.timed_out = self.throttled = 0
+
+    def acquire(self):
+        with self.condition:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self.rejected += 1
+                    return False
+                self.waiting += 1
+                try:
+                    admitted = self.condition.wait_for(lambda: self.active < self.concurrency, self.timeout)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.timed_out += 1
+                    return False
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                key: getattr(self, key) for key in (
+                    "concurrency", "queue", "active", "waiting", "admitted", "rejected", "timed_out", "throttled"
+                )
+            }
+
+
+gates = {}
+gates_lock = threading.Lock()
+
+
+def get_gate(name):
+    with gates_lock:
+        if name not in gates:
+            limits = getattr(settings, "REACT_ADMIN_ADMISSION", {})
+            gates[name] = Gate(name, **{**DEFAULT_LIMITS[name], **limits.get(name, {})})
+        return gates[name]
+
+
+def take_token(user):
+    """Per-user token bucket shared through the cache, returns seconds to wait or 0."""
+    rate, burst = getattr(settings, "REACT_ADMIN_USER_RATE", (5, 20))
+    key = f"react_admin:admission:bucket:{user.pk}"
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), burst / rate + 1)
+        return (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), burst / rate + 1)
+    return 0
+
+
+def cost_key(view, request):
+    return facets.cache_key(view.model, request, "cost")
+
+
+def get_cost(view, request):
+    """Rows a list request is expected to return, from the count of an earlier identical request."""
+    if not hasattr(view, "model"):
+        return None
+    return cache.get(cost_key(view, request))
+
+
+def set_cost(view, request, count):
+    cache.set(cost_key(view, request), count, facets.get_timeout())
+
+
+def get_endpoint_class(view, request):
+    name = getattr(view, "admission_class", None) or view.admission_classes.get(getattr(view, "action", None))
+    if name in ("list", "search"):
+        if request.query_params.get("search"):
+            name = "search"
+        cost = get_cost(view, request)
+        paginator = getattr(view, "paginator", None)
+        # Large unpaginated lists share the narrow export lane
+        if (cost is not None and cost > getattr(settings, "REACT_ADMIN_ADMISSION_HEAVY_ROWS", 10000)
+                and (paginator is None or paginator.get_page_size(request) is None)):
+            name = "export"
+    return name
+
+
+def admit(view, request):
+    """Return the gate `request` was admitted through, or raise 429/503."""
+    name = get_endpoint_class(view, request)
+    if name is None:
+        return None
+    gate = get_gate(name)
+
+    wait = take_token(request.user)
+    if wait:
+        with gate.condition:
+            gate.throttled += 1
+        raise Throttled(wait=wait)
+    if not gate.acquire():
+        raise Overloaded(wait=gate.timeout)
+    return gate
+
+
+class AdmissionMixin:
+    """Limit how many expensive requests run at once, see `DEFAULT_LIMITS`."""
+    admission_classes = {}
+    admission_gate = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.admission_gate = admit(self, request)
+
+    def dispatch(self, request, *args, **kwargs):
+        # DRF re-raises errors that are not APIException without finalizing
+        # the response, so release here to not leak the slot on a 500.
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.admission_gate is not None:
+                self.admission_gate.release()
+                self.admission_gate = None
+
+
+def metrics():
+    return {name: get_gate(name).stats() for name in DEFAULT_LIMITS}
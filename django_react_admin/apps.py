@@ -0,0 +1,24 @@
+from django.apps import AppConfig
+
+
+class ReactAdminConfig(AppConfig):
+    name = 'django_react_admin'
+
+    def ready(self):
+        # Connect the receivers here rather than in views, which are only
+        # imported with the URLconf, so writes from shells, workers and
+        # processes that have not served the API yet are seen too.
+        from django.contrib import admin
+        from django.contrib.auth import get_user_model
+        from django.http import HttpRequest
+        from rest_framework.request import Request
+        from . import changefeed, facets, profiles
+
+        r = Request(HttpRequest())
+        r.user = get_user_model()(is_superuser=True)
+
+        profiles.track()
+        admin.autodiscover()
+        for model, model_admin in admin.site._registry.items():
+            changefeed.track(model)
+            facets.track(model, facets.get_list_filter_names(model_admin, r))
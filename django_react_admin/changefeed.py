@@ -0,0 +1,197 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.utils.module_loading import import_string
+
+
+ChangeEvent = namedtuple("ChangeEvent", ["cursor", "model", "pk", "action", "timestamp"])
+
+
+class MemoryChangeLog:
+    """Bounded in-process log of create/update/delete events.
+
+    Cursors grow monotonically, so a client that remembers the last cursor it
+    saw can ask for everything after it. Clients see them as
+    ``"<epoch>:<n>"``, the epoch is unique to this log so a cursor issued by
+    another process or before a restart is recognised as unknown. Waiting
+    subscribers share one condition, so notifying many of them is a single
+    ``notify_all``.
+    """
+    def __init__(self, size=1000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.events = deque(maxlen=size)
+        self.counter = itertools.count(1)
+        self.condition = threading.Condition()
+
+    @property
+    def cursor(self):
+        with self.condition:
+            return self.events[-1].cursor if self.events else 0
+
+    def format_cursor(self, cursor):
+        return f"{self.epoch}:{cursor}"
+
+    def parse_cursor(self, value):
+        """Return the position of a client cursor, None if another log issued it.
+
+        Raises ValueError for a malformed cursor.
+        """
+        epoch, _, cursor = str(value).rpartition(":")
+        cursor = int(cursor)
+        return cursor if epoch == self.epoch else None
+
+    def append(self, model, pk, action):
+        with self.condition:
+            event = ChangeEvent(next(self.counter), model, pk, action, time.time())
+            self.events.append(event)
+            self.condition.notify_all()
+        return event
+
+    def since(self, model, cursor):
+        """Return events for `model` after `cursor`, or None if the log cannot tell what changed since it.
+
+        That is the case when the log was truncated past `cursor`, and when
+        `cursor` is ahead of the log because it came from before a restart or
+        from another process.
+        """
+        with self.condition:
+            latest = self.events[-1].cursor if self.events else 0
+            if cursor > latest or (self.events and cursor < self.events[0].cursor - 1):
+                return None
+            return [e for e in self.events if e.cursor > cursor and e.model == model]
+
+    def wait(self, cursor, timeout):
+        """Block until an event newer than `cursor` is appended or `timeout` elapses."""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: self.events and self.events[-1].cursor > cursor, timeout
+            )
+
+
+def get_change_log():
+    global _change_log
+    if _change_log is None:
+        backend = import_string(
+            getattr(settings, "REACT_ADMIN_CHANGEFEED_BACKEND", "django_react_admin.changefeed.MemoryChangeLog")
+        )
+        _change_log = backend(size=getattr(settings, "REACT_ADMIN_CHANGEFEED_SIZE", 1000))
+    return _change_log
+
+
+_change_log = None
+
+
+def model_label(model):
+    return f"{model._meta.app_label}.{model._meta.model_name}"
+
+
+def record(model, pk, action):
+    label = model_label(model)
+    # Only publish what other connections can actually read.
+    transaction.on_commit(lambda: get_change_log().append(label, pk, action))
+
+
+def on_post_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record(sender, instance.pk, "create" if created else "update")
+
+
+def on_post_delete(sender, instance, **kwargs):
+    record(sender, instance.pk, "delete")
+
+
+def on_m2m_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if type(instance) in _tracked:
+        record(type(instance), instance.pk, "update")
+    if model in _tracked and pk_set:
+        for pk in pk_set:
+            record(model, pk, "update")
+
+
+_tracked = set()
+
+
+def track(model):
+    """Record changes of `model` in the change log."""
+    if model in _tracked:
+        return
+    _tracked.add(model)
+    uid = f"react_admin_changefeed_{model_label(model)}"
+    post_save.connect(on_post_save, sender=model, dispatch_uid=uid)
+    post_delete.connect(on_post_delete, sender=model, dispatch_uid=uid)
+    for field in model._meta.many_to_many:
+        m2m_changed.connect(on_m2m_changed, sender=field.remote_field.through, dispatch_uid=uid)
+
+
+_open_streams = 0
+_open_streams_lock = threading.Lock()
+
+
+class EventStream:
+    """Iterator over `event_stream` holding one of the open stream slots until closed."""
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        global _open_streams
+        if self.closed:
+            return
+        self.closed = True
+        self.events.close()
+        with _open_streams_lock:
+            _open_streams -= 1
+
+
+def open_stream(model, cursor):
+    """Return an `EventStream` for `model`, or None when too many streams are open in this process."""
+    global _open_streams
+    with _open_streams_lock:
+        if _open_streams >= getattr(settings, "REACT_ADMIN_CHANGEFEED_MAX_STREAMS", 32):
+            return None
+        _open_streams += 1
+    return EventStream(
+        event_stream(model, cursor, lifetime=getattr(settings, "REACT_ADMIN_CHANGEFEED_STREAM_TIMEOUT", 300))
+    )
+
+
+def event_stream(model, cursor, heartbeat=15, lifetime=300):
+    """Yield Server-Sent Events telling that `model` changed after `cursor`.
+
+    Events carry no row ids, the stream does not know the user's queryset and
+    filters; clients fetch ``changes/`` on ``change`` and reload on ``reset``.
+    A `cursor` of None starts with a ``reset``. The stream ends after
+    `lifetime` seconds so it does not hold a worker forever; the browser then
+    reconnects with ``Last-Event-ID``.
+    """
+    log = get_change_log()
+    label = model_label(model)
+    deadline = time.monotonic() + lifetime
+    yield "retry: 3000\n\n"
+    while True:
+        latest = log.cursor
+        events = None if cursor is None else log.since(label, cursor)
+        if events is None:
+            yield f"event: reset\nid: {log.format_cursor(latest)}\ndata: {{}}\n\n"
+            cursor = latest
+            continue
+        # Events of other models move the log forward too; skip past them.
+        cursor = max([latest] + [e.cursor for e in events])
+        if events:
+            yield f"event: change\nid: {log.format_cursor(cursor)}\ndata: {{}}\n\n"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not log.wait(cursor, min(heartbeat, remaining)):
+            yield ": keep-alive\n\n"
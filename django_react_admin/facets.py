@@ -0,0 +1,113 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.admin.utils import get_fields_from_path, NotRelationField
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import Count
+from django.db.models.functions import Trunc
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .changefeed import model_label
+from .utils import get_cache_version, bump_cache_version
+
+# Query parameters that do not change the counts
+IGNORED_PARAMS = ('page', 'page_size', 'ordering', 'format')
+
+
+def get_list_filter_names(model_admin, request):
+    """Field paths of `list_filter`, ListFilter classes have no field and are skipped."""
+    names = []
+    for list_filter in model_admin.get_list_filter(request):
+        if isinstance(list_filter, str):
+            names.append(list_filter)
+        elif isinstance(list_filter, (list, tuple)):
+            names.append(list_filter[0])
+    return names
+
+
+def get_path_fields(model, path):
+    try:
+        return get_fields_from_path(model, path)
+    except (FieldDoesNotExist, NotRelationField):
+        return None
+
+
+def facet_counts(queryset, path, fields, date_kind='month'):
+    """Count rows of `queryset` grouped by the value at `path` in a single query.
+
+    Counts are always distinct, joins of the facet itself or of other active
+    filters and search through multi-valued relations duplicate rows.
+    """
+    field = fields[-1]
+    queryset = queryset.order_by()
+
+    if isinstance(field, models.DateField):
+        queryset = queryset.annotate(facet_value=Trunc(path, date_kind))
+        key = 'facet_value'
+    else:
+        key = path
+    rows = queryset.values(key).annotate(count=Count('pk', distinct=True)).order_by('-count')
+
+    counts = [(row[key], row['count']) for row in rows]
+    if field.is_relation:
+        objects = field.related_model._default_manager.in_bulk([value for value, count in counts if value is not None])
+        labels = {pk: str(obj) for pk, obj in objects.items()}
+    elif field.choices:
+        labels = {value: str(label) for value, label in field.flatchoices}
+    else:
+        labels = {}
+
+    return [
+        {"value": value, "label": labels.get(value, value), "count": count}
+        for value, count in counts
+    ]
+
+
+def version_key(model):
+    return f"react_admin:facets:version:{model_label(model)}"
+
+
+def cache_key(model, request, prefix="facets"):
+    params = sorted(
+        (key, sorted(values)) for key, values in request.query_params.lists()
+        if key not in IGNORED_PARAMS
+    )
+    digest = hashlib.md5(repr((request.user.pk, params)).encode('utf-8')).hexdigest()
+    return f"react_admin:{prefix}:{model_label(model)}:{get_cache_version(version_key(model))}:{digest}"
+
+
+def get_timeout():
+    return getattr(settings, "REACT_ADMIN_FACETS_TIMEOUT", 300)
+
+
+_dependents = defaultdict(set)
+
+
+def invalidate(sender, **kwargs):
+    for model in _dependents.get(sender, ()):
+        bump_cache_version(version_key(model))
+
+
+def get_through(field):
+    return getattr(field, 'through', None) or field.remote_field.through
+
+
+def track(model, paths):
+    """Invalidate cached facets of `model` when it or a model its facet `paths` go through changes."""
+    senders = {model}
+    senders.update(get_through(field) for field in model._meta.many_to_many)
+    for path in paths:
+        for field in get_path_fields(model, path) or ():
+            if field.is_relation:
+                senders.add(field.related_model)
+            if field.many_to_many:
+                senders.add(get_through(field))
+
+    for sender in senders:
+        _dependents[sender].add(model)
+        uid = f"react_admin_facets_{model_label(sender)}"
+        post_save.connect(invalidate, sender=sender, dispatch_uid=uid)
+        post_delete.connect(invalidate, sender=sender, dispatch_uid=uid)
+        m2m_changed.connect(invalidate, sender=sender, dispatch_uid=uid)
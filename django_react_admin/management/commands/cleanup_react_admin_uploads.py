@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+
+from django_react_admin import uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete parts of expired react-admin upload sessions'
+
+    def handle(self, *args, **options):
+        storages = {
+            id(field.storage): field.storage
+            for model in admin.site._registry
+            for field in model._meta.fields if field.name in uploads.get_file_fields(model)
+        }
+        removed = sum(uploads.cleanup(storage) for storage in storages.values())
+        self.stdout.write(f'Removed {removed} expired upload sessions')
@@ -0,0 +1,100 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .changefeed import model_label
+from .utils import get_cache_version, bump_cache_version
+
+GLOBAL_VERSION_KEY = "react_admin:permissions:version"
+
+
+def user_version_key(pk):
+    return f"react_admin:permissions:version:user:{pk}"
+
+
+def get_allowed_methods(model_admin, request):
+    if hasattr(model_admin, "get_allowed_request_methods"):
+        return list(model_admin.get_allowed_request_methods(request))
+
+    methods = []
+    if model_admin.has_view_or_change_permission(request):
+        methods += ["GET", "HEAD", "OPTIONS"]
+    if model_admin.has_add_permission(request):
+        methods += ["POST"]
+    if model_admin.has_change_permission(request):
+        methods += ["PUT", "PATCH"]
+    if model_admin.has_delete_permission(request):
+        methods += ["DELETE"]
+    return methods
+
+
+def get_allowed_actions(model_admin, request):
+    if hasattr(model_admin, "get_allowed_actions"):
+        return list(model_admin.get_allowed_actions(request))
+    return list(model_admin.get_actions(request))
+
+
+def compile_profile(model_admin, request):
+    return {
+        "methods": get_allowed_methods(model_admin, request),
+        "actions": get_allowed_actions(model_admin, request),
+        "fields": list(model_admin.get_fields(request)),
+        "readonly_fields": list(model_admin.get_readonly_fields(request)),
+    }
+
+
+def get_permission_profile(request, model_admin):
+    """Return what `request.user` may do with the model of `model_admin`.
+
+    The profile is memoized on the request and cached across requests until
+    the user, their groups or permissions change.
+    """
+    label = model_label(model_admin.model)
+    memo = request._request.__dict__.setdefault("_react_admin_permissions", {})
+    if label in memo:
+        return memo[label]
+
+    user = request.user
+    key = "react_admin:permissions:{}:{}:{}:{}".format(
+        get_cache_version(GLOBAL_VERSION_KEY), user.pk, get_cache_version(user_version_key(user.pk)), label
+    )
+    profile = cache.get(key)
+    if profile is None:
+        profile = compile_profile(model_admin, request)
+        cache.set(key, profile, getattr(settings, "REACT_ADMIN_PERMISSIONS_TIMEOUT", 60))
+    memo[label] = profile
+    return profile
+
+
+def invalidate_user(sender, instance, **kwargs):
+    bump_cache_version(user_version_key(instance.pk))
+
+
+def invalidate_all(sender, **kwargs):
+    bump_cache_version(GLOBAL_VERSION_KEY)
+
+
+def invalidate_membership(sender, instance, **kwargs):
+    if isinstance(instance, get_user_model()):
+        bump_cache_version(user_version_key(instance.pk))
+    else:
+        bump_cache_version(GLOBAL_VERSION_KEY)
+
+
+def track():
+    """Drop cached profiles when users, groups or permissions change."""
+    user_model = get_user_model()
+    for signal in (post_save, post_delete):
+        signal.connect(invalidate_user, sender=user_model, dispatch_uid="react_admin_permissions_user")
+        signal.connect(invalidate_all, sender=Group, dispatch_uid="react_admin_permissions_group")
+        signal.connect(invalidate_all, sender=Permission, dispatch_uid="react_admin_permissions_permission")
+
+    throughs = [Group.permissions.through]
+    # Custom user models may not use PermissionsMixin
+    throughs += [getattr(user_model, name).through for name in ("groups", "user_permissions") if hasattr(user_model, name)]
+    for through in throughs:
+        m2m_changed.connect(
+            invalidate_membership, sender=through, dispatch_uid="react_admin_permissions_membership"
+        )
@@ -2,4 +2,9 @@ from rest_framework import serializers
 
 
 class ActionSerializer(serializers.Serializer):
-	id = serializers.JSONField()
\ No newline at end of file
+	id = serializers.JSONField()
+
+
+class UploadSerializer(serializers.Serializer):
+	filename = serializers.CharField(max_length=255)
+	size = serializers.IntegerField(min_value=0)
@@ -0,0 +1,180 @@
+import io
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase, override_settings
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from . import admission
+from .admission import AdmissionMixin
+from .uploads import LimitedStream, PartsFile
+
+
+class LimitedStreamTest(SimpleTestCase):
+    def test_reads_up_to_limit(self):
+        stream = LimitedStream(io.BytesIO(b"12345"), 5)
+        self.assertEqual(stream.read(3), b"123")
+        self.assertEqual(stream.read(), b"45")
+        self.assertEqual(stream.read(), b"")
+        self.assertFalse(stream.exceeded)
+
+    def test_detects_overrun(self):
+        source = io.BytesIO(b"123456789")
+        stream = LimitedStream(source, 4)
+        self.assertEqual(stream.read(100), b"1234")
+        self.assertEqual(stream.read(100), b"")
+        self.assertTrue(stream.exceeded)
+        # Only one byte past the limit is consumed to notice the overrun
+        self.assertEqual(source.tell(), 5)
+
+
+class PartsFileTest(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.location)
+        self.parts = [
+            self.storage.save(f"parts/{i}.part", ContentFile(data)) for i, data in enumerate([b"abc", b"", b"defg"])
+        ]
+        self.file = PartsFile(self.storage, self.parts, "joined", 7)
+
+    def tearDown(self):
+        self.file.close()
+        shutil.rmtree(self.location)
+
+    def test_read_across_parts(self):
+        self.assertEqual(self.file.read(2), b"ab")
+        self.assertEqual(self.file.read(3), b"cde")
+        self.assertEqual(self.file.tell(), 5)
+        self.assertEqual(self.file.read(), b"fg")
+        self.assertEqual(self.file.read(), b"")
+
+    def test_seek_rewinds(self):
+        self.file.read(4)
+        self.assertEqual(self.file.seek(0), 0)
+        self.assertEqual(self.file.tell(), 0)
+        self.assertEqual(self.file.read(), b"abcdefg")
+        with self.assertRaises(io.UnsupportedOperation):
+            self.file.seek(2)
+
+    def test_chunks(self):
+        self.assertEqual(b"".join(self.file.chunks(chunk_size=2)), b"abcdefg")
+        self.assertEqual(self.file.size, 7)
+
+
+class GatedView(AdmissionMixin, GenericAPIView):
+    permission_classes = []
+    admission_class = "list"
+    error = None
+
+    def get(self, request):
+        if self.error is not None:
+            raise self.error
+        return Response("ok")
+
+
+class ListPagination(PageNumberPagination):
+    page_size = 10
+
+
+class ListView(AdmissionMixin, GenericAPIView):
+    permission_classes = []
+    admission_classes = {"list": "list"}
+    pagination_class = ListPagination
+    model = get_user_model()
+    action = "list"
+
+
+@override_settings(
+    REACT_ADMIN_USER_RATE=(1000, 1000),
+    REACT_ADMIN_ADMISSION={"list": {"concurrency": 2, "queue": 1, "timeout": 0.05}},
+)
+class AdmissionTest(SimpleTestCase):
+    def setUp(self):
+        admission.gates.clear()
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.user = get_user_model()(pk=1)
+
+    def get(self, view=GatedView, path="/", **initkwargs):
+        request = self.factory.get(path)
+        force_authenticate(request, self.user)
+        return view.as_view(**initkwargs)(request)
+
+    def test_gate_admits_up_to_concurrency(self):
+        gate = admission.Gate("list", concurrency=2, queue=0, timeout=0)
+        self.assertTrue(gate.acquire())
+        self.assertTrue(gate.acquire())
+        self.assertFalse(gate.acquire())
+        gate.release()
+        self.assertTrue(gate.acquire())
+        self.assertEqual(gate.stats()["active"], 2)
+        self.assertEqual(gate.stats()["rejected"], 1)
+
+    def test_gate_queued_request_is_admitted_on_release(self):
+        gate = admission.Gate("list", concurrency=1, queue=1, timeout=5)
+        gate.acquire()
+        threading.Timer(0.05, gate.release).start()
+        self.assertTrue(gate.acquire())
+        self.assertEqual(gate.stats()["waiting"], 0)
+
+    def test_gate_times_out(self):
+        gate = admission.Gate("list", concurrency=1, queue=1, timeout=0.05)
+        gate.acquire()
+        self.assertFalse(gate.acquire())
+        self.assertEqual(gate.stats()["timed_out"], 1)
+        self.assertEqual(gate.stats()["waiting"], 0)
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        gate = admission.get_gate("list")
+        gate.acquire()
+        gate.acquire()
+        # The only queue place is taken by a request waiting in another thread
+        waiter = threading.Thread(target=admission.Gate.acquire, args=(gate,))
+        gate.timeout = 1
+        waiter.start()
+        while gate.stats()["waiting"] == 0:
+            time.sleep(0.001)
+        response = self.get()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(gate.stats()["rejected"], 1)
+        gate.release()
+        waiter.join()
+
+    def test_slot_released_after_unhandled_error(self):
+        for _ in range(3):
+            with self.assertRaises(RuntimeError):
+                self.get(error=RuntimeError())
+        self.assertEqual(admission.get_gate("list").stats()["active"], 0)
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(REACT_ADMIN_USER_RATE=(1, 2))
+    def test_empty_bucket_is_throttled(self):
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get().status_code, 200)
+        response = self.get()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(admission.get_gate("list").stats()["throttled"], 1)
+
+    def test_heavy_paginated_list_keeps_list_lane(self):
+        request = Request(self.factory.get("/?page=3"))
+        request.user = self.user
+        admission.set_cost(ListView(), request, 20000)
+        self.assertEqual(admission.get_endpoint_class(ListView(), request), "list")
+
+    def test_heavy_unpaginated_list_uses_export_lane(self):
+        request = Request(self.factory.get("/"))
+        request.user = self.user
+        admission.set_cost(ListView(), request, 20000)
+        self.assertEqual(admission.get_endpoint_class(ListView(pagination_class=None), request), "export")
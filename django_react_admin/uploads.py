@@ -0,0 +1,259 @@
+import io
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connection, models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=1)
+
+
+def get_file_fields(model):
+    return [field.name for field in model._meta.fields if isinstance(field, models.FileField)]
+
+
+def session_key(upload_id):
+    return f"react_admin:upload:{upload_id}"
+
+
+def get_timeout():
+    return getattr(settings, "REACT_ADMIN_UPLOAD_TIMEOUT", 24 * 60 * 60)
+
+
+def get_upload_dir():
+    return getattr(settings, "REACT_ADMIN_UPLOAD_DIR", "react_admin_uploads")
+
+
+def lock_session(upload_id):
+    """Take the session lock, False if another request holds it."""
+    return cache.add(f"{session_key(upload_id)}:lock", True, getattr(settings, "REACT_ADMIN_UPLOAD_LOCK_TIMEOUT", 600))
+
+
+def unlock_session(upload_id):
+    cache.delete(f"{session_key(upload_id)}:lock")
+
+
+def create_session(instance, field_name, user, filename, size):
+    session = {
+        "id": uuid.uuid4().hex,
+        "pk": instance.pk,
+        "field_name": field_name,
+        "filename": os.path.basename(filename),
+        "size": size,
+        "offset": 0,
+        "parts": [],
+        "user": user.pk,
+    }
+    save_session(session)
+    return session
+
+
+def get_session(upload_id, instance, field_name, user):
+    session = cache.get(session_key(upload_id))
+    if session is None or (session["pk"], session["field_name"], session["user"]) != (instance.pk, field_name, user.pk):
+        return None
+    return session
+
+
+def save_session(session):
+    cache.set(session_key(session["id"]), session, get_timeout())
+
+
+def delete_session(session, storage):
+    for part in session["parts"]:
+        storage.delete(part)
+    storage.delete(f"{get_upload_dir()}/{session['id']}")
+    cache.delete(session_key(session["id"]))
+
+
+class LimitedStream:
+    """Read at most `limit` bytes of `stream`, noting whether it had more."""
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.remaining = limit
+        self.exceeded = False
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            self.exceeded = self.exceeded or bool(self.stream.read(1))
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def write_chunk(session, storage, stream):
+    """Stream the request body into a new part in `storage` without buffering it.
+
+    Nothing past the declared upload size is written; False means the body
+    was longer and the part was dropped.
+    """
+    stream = LimitedStream(stream, session["size"] - session["offset"])
+    name = storage.save(
+        f"{get_upload_dir()}/{session['id']}/{session['offset']:020d}.part", File(stream, name="chunk")
+    )
+    if stream.exceeded:
+        storage.delete(name)
+        return False
+
+    session["parts"].append(name)
+    session["offset"] += storage.size(name)
+    save_session(session)
+    return True
+
+
+class PartsFile(File):
+    """Read-only file joining the uploaded parts in order."""
+    def __init__(self, storage, parts, name, size):
+        super().__init__(None, name)
+        self.storage = storage
+        self.parts = parts
+        self._size = size
+        self.index = 0
+        self.current = None
+        self.position = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def closed(self):
+        return False
+
+    def open(self, mode=None):
+        self.seek(0)
+        return self
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if (offset, whence) != (0, io.SEEK_SET):
+            raise io.UnsupportedOperation("PartsFile can only be rewound")
+        self.close()
+        self.index = 0
+        self.position = 0
+        return 0
+
+    def tell(self):
+        return self.position
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        data = []
+        while size != 0:
+            if self.current is None:
+                if self.index >= len(self.parts):
+                    break
+                self.current = self.storage.open(self.parts[self.index], "rb")
+                self.index += 1
+            chunk = self.current.read(size)
+            if not chunk:
+                self.close()
+                continue
+            data.append(chunk)
+            if size > 0:
+                size -= len(chunk)
+        data = b"".join(data)
+        self.position += len(data)
+        return data
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+
+def commit(session, instance):
+    """Attach the uploaded parts to `instance` and schedule post-processing."""
+    fieldfile = getattr(instance, session["field_name"])
+    storage = fieldfile.storage
+    fieldfile.save(
+        session["filename"], PartsFile(storage, session["parts"], session["filename"], session["size"]), save=False
+    )
+    instance.save(update_fields=[session["field_name"]])
+    delete_session(session, storage)
+
+    model, pk, field_name = type(instance), instance.pk, session["field_name"]
+    transaction.on_commit(lambda: executor.submit(run_postprocess, model, pk, field_name))
+    return fieldfile
+
+
+def run_postprocess(model, pk, field_name):
+    try:
+        import_string(
+            getattr(settings, "REACT_ADMIN_UPLOAD_POSTPROCESS", "django_react_admin.uploads.postprocess_image")
+        )(model, pk, field_name)
+    except Exception:
+        logger.exception("Post-processing %s.%s of %s failed", model.__name__, field_name, pk)
+    finally:
+        connection.close()
+
+
+def postprocess_image(model, pk, field_name):
+    """Fill image dimension fields and store a thumbnail next to the image."""
+    field = model._meta.get_field(field_name)
+    if not isinstance(field, models.ImageField):
+        return
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field_name):
+        return
+
+    dimension_fields = [name for name in (field.width_field, field.height_field) if name]
+    if dimension_fields:
+        field.update_dimension_fields(instance, force=True)
+        instance.save(update_fields=dimension_fields)
+
+    fieldfile = getattr(instance, field_name)
+    with fieldfile.open("rb"):
+        image = Image.open(fieldfile)
+        image_format = image.format
+        image.thumbnail(getattr(settings, "REACT_ADMIN_THUMBNAIL_SIZE", (200, 200)))
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+
+    root, ext = os.path.splitext(fieldfile.name)
+    fieldfile.storage.save(f"{root}.thumb{ext}", ContentFile(buffer.getvalue()))
+
+
+def cleanup(storage):
+    """Delete parts of upload sessions that expired, returns how many sessions were removed."""
+    upload_dir = get_upload_dir()
+    try:
+        upload_ids = storage.listdir(upload_dir)[0]
+    except (FileNotFoundError, NotImplementedError):
+        return 0
+
+    cutoff = (timezone.now() if settings.USE_TZ else datetime.now()) - timedelta(seconds=get_timeout())
+    removed = 0
+    for upload_id in upload_ids:
+        if cache.get(session_key(upload_id)) is not None:
+            continue
+        path = f"{upload_dir}/{upload_id}"
+        parts = [f"{path}/{part}" for part in storage.listdir(path)[1]]
+        # A per-process cache may not know sessions of other workers, so keep recent parts
+        try:
+            if any(storage.get_modified_time(part) > cutoff for part in parts):
+                continue
+        except NotImplementedError:
+            pass
+        for part in parts:
+            storage.delete(part)
+        storage.delete(path)
+        removed += 1
+    return removed
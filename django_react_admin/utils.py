@@ -1,5 +1,8 @@
 from subprocess import Popen, PIPE
 import os
+import time
+
+from django.core.cache import cache
 
 
 def vuetify(src):
@@ -22,3 +25,15 @@ def fail(cmd, msg=None):
     if not run(cmd):
         raise OSError('Failed to run {}'.format(cmd) if msg is None else msg)
     return True
+
+
+def get_cache_version(key):
+    # Start from the clock so an evicted version never reuses an old key.
+    return cache.get_or_set(key, int(time.time() * 1000), None)
+
+
+def bump_cache_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
@@ -1,10 +1,11 @@
 from django.conf.urls import url
 from django.contrib import admin
-from django.http import HttpRequest, HttpResponse
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.urls import path, reverse
 from django.views.generic import TemplateView
 from django.contrib.auth import get_user_model
-from rest_framework import viewsets, permissions, views, pagination
+from rest_framework import viewsets, permissions, views, pagination, renderers
 from django_filters.rest_framework.backends import DjangoFilterBackend
 from rest_framework.decorators import action, MethodMapper
 from rest_framework.filters import OrderingFilter, SearchFilter
@@ -14,11 +15,13 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.reverse import reverse_lazy
 from rest_framework.routers import DefaultRouter
 from rest_framework.serializers import ModelSerializer
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, ValidationError, NotFound
 from rest_framework import status
 import urllib.parse
 import json
-from .serializers import ActionSerializer
+from .serializers import ActionSerializer, UploadSerializer
+from . import admission, changefeed, facets, profiles, uploads
+from .profiles import get_permission_profile
 
 
 router = DefaultRouter()
@@ -37,19 +40,56 @@ class MethodNotAllowed(APIException):
     default_code = 'method_not_allowed'
 
 
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = {'error': True, 'message': 'cursor expired, reload the list'}
+    default_code = 'cursor_expired'
+
+
+class TooManyStreams(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = {'error': True, 'message': 'too many open change streams'}
+    default_code = 'too_many_streams'
+    wait = 30
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = {'error': True, 'message': 'upload offset mismatch'}
+    default_code = 'upload_conflict'
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Only errors are rendered, the stream itself bypasses renderers.
+        return json.dumps(data).encode('utf-8')
+
+
 class IsAllowMethod(permissions.BasePermission):
     def has_permission(self, request, view):
-        return True
-#         if hasattr(view.model_admin, "get_allowed_request_methods") and request.method in view.model_admin.get_allowed_request_methods(request):
-#             return True
-#         raise MethodNotAllowed()
+        if request.method in get_permission_profile(request, view.model_admin)["methods"]:
+            return True
+        raise MethodNotAllowed()
+
 
 class IsAllowAction(permissions.BasePermission):
     def has_permission(self, request, view):
-        return True
-#         if hasattr(view.model_admin, "get_allowed_actions") and view.action.__name__ in view.model_admin.get_allowed_actions(request):
-#             return True
-#         raise MethodNotAllowed()
+        if view.action.__name__ in get_permission_profile(request, view.model_admin)["actions"]:
+            return True
+        raise MethodNotAllowed()
+
+
+class IsAllowUpload(permissions.BasePermission):
+    def has_permission(self, request, view):
+        profile = get_permission_profile(request, view.model_admin)
+        field_name = view.kwargs.get('field_name')
+        if ("PATCH" in profile["methods"] and field_name in profile["fields"]
+                and field_name not in profile["readonly_fields"]):
+            return True
+        raise MethodNotAllowed()
 
 
 def to_representation(self, instance):
@@ -61,31 +101,41 @@ def to_representation(self, instance):
 
     return data
 
+serializer_classes = {}
+
+
 def get_serializer_class(self):
+    profile = get_permission_profile(self.request, self.model_admin)
+    key = (self.model, tuple(profile["fields"]), tuple(profile["readonly_fields"]))
+    if key in serializer_classes:
+        return serializer_classes[key]
+
     params = {
         "to_representation": to_representation
     }
 
     meta_props = {
         "model": self.model,
-        "fields": list(self.model_admin.get_fields(self.request)),
-        "read_only_fields": self.model_admin.get_readonly_fields(self.request)
+        "fields": profile["fields"],
+        "read_only_fields": profile["readonly_fields"]
     }
 
-    return type(
-        f"{model.__name__}Serializer",
+    serializer_classes[key] = type(
+        f"{self.model.__name__}Serializer",
         (ModelSerializer,),
         {
             **params,
             "Meta": type("Meta", (), meta_props)
         }
     )
+    return serializer_classes[key]
 
 def model_views_set_list(self, request, *args, **kwargs):
     queryset = self.filter_queryset(self.get_queryset())
 
     page = self.paginate_queryset(queryset)
     if page is not None:
+        admission.set_cost(self, request, self.paginator.page.paginator.count)
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
@@ -93,22 +143,166 @@ def model_views_set_list(self, request, *args, **kwargs):
     headers = {
         "X-Total-Count": queryset.count()
     }
+    admission.set_cost(self, request, headers["X-Total-Count"])
 
     return Response(
         serializer.data,
         headers=headers
     )
 
+def get_cursor(log, value):
+    try:
+        return log.parse_cursor(value)
+    except (TypeError, ValueError):
+        raise ValidationError({'since': 'malformed cursor'})
+
+
+@action(detail=False, methods=['get'])
+def changes(self, request):
+    log = changefeed.get_change_log()
+    latest = log.cursor
+    cursor = request.query_params.get('since')
+    cursor = latest if cursor is None else get_cursor(log, cursor)
+    events = None if cursor is None else log.since(changefeed.model_label(self.model), cursor)
+    if events is None:
+        raise CursorExpired()
+
+    last_action = {event.pk: event.action for event in events}
+    changed = [pk for pk, act in last_action.items() if act != 'delete']
+    queryset = self.filter_queryset(self.get_queryset()).filter(pk__in=changed)
+    serializer = self.get_serializer(queryset, many=True)
+    found = {obj.pk for obj in serializer.instance}
+
+    return Response({
+        "cursor": log.format_cursor(max([latest] + [event.cursor for event in events])),
+        "data": [{"id": obj.pk, **row} for obj, row in zip(serializer.instance, serializer.data)],
+        # Deleted rows and rows that no longer match the current filters
+        "removed": [pk for pk in last_action if pk not in found],
+    })
+
+
+@action(detail=False, methods=['get'], url_path='changes/stream', renderer_classes=[EventStreamRenderer])
+def changes_stream(self, request):
+    log = changefeed.get_change_log()
+    cursor = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('since')
+    # A cursor of another process or from before a restart starts with a reset
+    stream = changefeed.open_stream(self.model, log.cursor if cursor is None else get_cursor(log, cursor))
+    if stream is None:
+        raise TooManyStreams()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def filter_queryset_without(self, name):
+    """Apply the current search and filters except the ones on `name`."""
+    request = self.request._request
+    query = request.GET
+    request.GET = query.copy()
+    for key in query:
+        if key == name or key.startswith(f"{name}__"):
+            del request.GET[key]
+    try:
+        return self.filter_queryset(self.get_queryset())
+    finally:
+        request.GET = query
+
+
+@action(detail=False, methods=['get'], url_path='facets', url_name='facets')
+def facets_list(self, request):
+    key = facets.cache_key(self.model, request)
+    result = cache.get(key)
+    if result is None:
+        result = {}
+        for name in self.filterset_fields:
+            fields = facets.get_path_fields(self.model, name)
+            if fields is None:
+                continue
+            result[name] = facets.facet_counts(
+                filter_queryset_without(self, name), name, fields,
+                getattr(self.model_admin, 'facet_date_kind', 'month')
+            )
+        cache.set(key, result, facets.get_timeout())
+
+    return Response(result)
+
+
+def get_upload_session(self, request, field_name, upload_id):
+    if field_name not in uploads.get_file_fields(self.model):
+        raise NotFound()
+    instance = self.get_object()
+    session = uploads.get_session(upload_id, instance, field_name, request.user) if upload_id else None
+    if upload_id and session is None:
+        raise NotFound()
+    return instance, session
+
+
+def get_upload_state(session):
+    return {key: session[key] for key in ("id", "filename", "size", "offset")}
+
+
+upload_permission_classes = [permissions.IsAuthenticated, IsAllowUpload]
+
+
+@action(detail=True, methods=['post'], url_path=r'upload/(?P<field_name>\w+)', url_name='upload',
+        permission_classes=upload_permission_classes)
+def upload_start(self, request, pk=None, field_name=None):
+    instance, session = get_upload_session(self, request, field_name, None)
+    serializer = UploadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    session = uploads.create_session(instance, field_name, request.user, **serializer.validated_data)
+
+    return Response(get_upload_state(session), status=status.HTTP_201_CREATED)
+
+
+@action(detail=True, methods=['get', 'patch'], url_path=r'upload/(?P<field_name>\w+)/(?P<upload_id>[0-9a-f]{32})',
+        url_name='upload-chunk', permission_classes=upload_permission_classes)
+def upload_chunk(self, request, pk=None, field_name=None, upload_id=None):
+    if request.method != 'PATCH':
+        instance, session = get_upload_session(self, request, field_name, upload_id)
+        return Response(get_upload_state(session))
+
+    # Only one request may append to a session at a time
+    if not uploads.lock_session(upload_id):
+        raise UploadConflict()
+    try:
+        instance, session = get_upload_session(self, request, field_name, upload_id)
+        # Resuming clients send the offset they believe the server has
+        if request.META.get('HTTP_UPLOAD_OFFSET') != str(session['offset']):
+            raise UploadConflict()
+        if int(request.META.get('CONTENT_LENGTH') or 0) > session['size'] - session['offset']:
+            raise ValidationError({'size': 'chunk exceeds the declared upload size'})
+        storage = instance._meta.get_field(field_name).storage
+        if request.stream is not None and not uploads.write_chunk(session, storage, request.stream):
+            raise ValidationError({'size': 'chunk exceeds the declared upload size'})
+    finally:
+        uploads.unlock_session(upload_id)
+
+    return Response(get_upload_state(session))
+
+
+@action(detail=True, methods=['post'], url_path=r'upload/(?P<field_name>\w+)/(?P<upload_id>[0-9a-f]{32})/commit',
+        url_name='upload-commit', permission_classes=upload_permission_classes)
+def upload_commit(self, request, pk=None, field_name=None, upload_id=None):
+    if not uploads.lock_session(upload_id):
+        raise UploadConflict()
+    try:
+        instance, session = get_upload_session(self, request, field_name, upload_id)
+        if session['offset'] != session['size']:
+            raise UploadConflict()
+        fieldfile = uploads.commit(session, instance)
+    finally:
+        uploads.unlock_session(upload_id)
+
+    return Response({"id": instance.pk, field_name: urllib.parse.urlparse(fieldfile.url).path})
+
+
 for model, model_admin in admin.site._registry.items():
 
     def get_filterset_fields(model_admin):
         filterset_fields = {}
-        for filterset_field in list(model_admin.get_list_filter(r)):
-            if isinstance(filterset_field, str):
-                filterset_field_name = filterset_field
-            else:
-                filterset_field_name = filterset_field[0]
-
+        for filterset_field_name in facets.get_list_filter_names(model_admin, r):
             filterset_fields[filterset_field_name] = ['gte', 'lte', 'exact', 'gt', 'lt']
 
         return filterset_fields
@@ -163,9 +357,22 @@ for model, model_admin in admin.site._registry.items():
             [permissions.IsAuthenticated, IsAllowMethod]
         ),
         "pagination_class": CustomPageNumberPagination,
-        "list": model_views_set_list
+        "list": model_views_set_list,
+        "changes": changes,
+        "changes_stream": changes_stream,
+        "facets_list": facets_list,
+        "admission_classes": {
+            "list": "list",
+            "changes": "list",
+            "facets_list": "search",
+            "upload_start": "bulk",
+            "upload_chunk": "bulk",
+            "upload_commit": "bulk",
+        },
     }
-    viewset = type(f"{model.__name__}ViewSet", (viewsets.ModelViewSet,), params)
+    if uploads.get_file_fields(model):
+        params.update(upload_start=upload_start, upload_chunk=upload_chunk, upload_commit=upload_commit)
+    viewset = type(f"{model.__name__}ViewSet", (admission.AdmissionMixin, viewsets.ModelViewSet), params)
     router.register(
         f"{model._meta.app_label}/{model._meta.model_name}", viewset, model._meta.model_name
     )
@@ -191,8 +398,11 @@ for model, model_admin in admin.site._registry.items():
                 "model_admin": model_admin,
                 "action": action,
                 "post": method_post,
+                "admission_class": "action",
             }
-            apiview = type(f"{model.__name__}Action{action_title}APIView", (views.APIView,), params)
+            apiview = type(
+                f"{model.__name__}Action{action_title}APIView", (admission.AdmissionMixin, views.APIView), params
+            )
 
             actions_urlpatterns.append(path(
                 f"{model._meta.app_label}/{model._meta.model_name}/{action.__name__}/",
@@ -214,4 +424,14 @@ class Index(views.APIView):
         return Response(res)
 
 
-urlpatterns = [path('', Index.as_view(), name='react_admin_index')] + actions_urlpatterns + router.urls
+class AdmissionMetrics(views.APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(admission.metrics())
+
+
+urlpatterns = [
+    path('', Index.as_view(), name='react_admin_index'),
+    path('admission/', AdmissionMetrics.as_view(), name='react_admin_admission'),
+] + actions_urlpatterns + router.urls